@@ -3,16 +3,57 @@
 //! Usage:
 //!   btree_cli <db_path> put <key> <value>
 //!   btree_cli <db_path> get <key>
+//!   btree_cli <db_path> mget <key>...
 //!   btree_cli <db_path> delete <key>
 //!   btree_cli <db_path> scan [start] [end]
+//!   btree_cli <db_path> scan_bin [start] [end]
 //!   btree_cli <db_path> stats
-//!   btree_cli <db_path> bulk_insert <count>
+//!   btree_cli <db_path> bulk_insert <count> [progress_every]
+//!   btree_cli <db_path> put_many <count>   (reads count records from stdin)
 //!   btree_cli <db_path> debug <key>
+//!   btree_cli <db_path> repl
+//!
+//! The `repl` command keeps the database open and reads commands from stdin
+//! until `quit` or EOF. Arguments are length-framed so they may contain any
+//! bytes: a command is a line `<command> <len>...` giving the byte length of
+//! each argument, followed by the raw argument bytes back to back. For
+//! example `put 1 11\nkhello world` stores key `k` with value `hello world`.
+//!
+//! Each command gets a reply whose first line is a status: `OK`, `DELETED`,
+//! `NOT_FOUND` or `ERR <message>`. Replies carrying data give its byte length
+//! in the status line and follow it with the raw bytes: `VALUE <n>` (get),
+//! `LINES <n>` (text output of scan, stats, bulk_insert, debug) and
+//! `BYTES <n>` (scan_bin). mget replies `VALUES <n>` followed by one
+//! `VALUE <len>` or `NOT_FOUND` reply per key, in order.
+//!
+//! With `progress_every`, bulk_insert writes a `PROGRESS: <inserted>` line
+//! every that many records, before its reply, so callers can follow it live.
+//!
+//! `scan_bin` encodes its results as a big-endian `u32` row count followed by
+//! `<u32 key_len><key><u32 value_len><value>` for each row. `put_many` reads
+//! its records from stdin in the same `<u32 key_len><key><u32 value_len><value>`
+//! form.
 
-use btree_storage::{Config, Db};
+use btree_storage::types::{MAX_KEY_SIZE, MAX_VALUE_SIZE};
+use btree_storage::{Config, Db, StorageError};
 use std::env;
+use std::io::{self, BufRead, BufWriter, Read, Write};
 use std::process::exit;
 
+/// Output of a single command.
+enum Reply {
+    /// A single status line (`OK`, `DELETED`, `NOT_FOUND`)
+    Status(&'static str),
+    /// A value returned by `get`
+    Value(Vec<u8>),
+    /// Values returned by `mget`, `None` for missing keys
+    Values(Vec<Option<Vec<u8>>>),
+    /// Multiple output lines
+    Lines(Vec<String>),
+    /// Raw binary output
+    Bytes(Vec<u8>),
+}
+
 fn main() {
     let args: Vec<String> = env::args().collect();
 
@@ -21,10 +62,14 @@ fn main() {
         eprintln!("Commands:");
         eprintln!("  put <key> <value>   - Insert or update a key-value pair");
         eprintln!("  get <key>           - Get value for a key");
+        eprintln!("  mget <key>...       - Get values for several keys, one line per key");
         eprintln!("  delete <key>        - Delete a key");
         eprintln!("  scan [start] [end]  - Scan keys in range");
+        eprintln!("  scan_bin [start] [end] - Scan keys in range, length-prefixed binary output");
         eprintln!("  stats               - Show database statistics");
-        eprintln!("  bulk_insert <count> - Insert count test records");
+        eprintln!("  bulk_insert <count> [progress_every] - Insert count test records");
+        eprintln!("  put_many <count>    - Insert count length-prefixed records read from stdin");
+        eprintln!("  repl                - Read commands from stdin until quit/EOF");
         exit(1);
     }
 
@@ -40,155 +85,396 @@ fn main() {
         }
     };
 
-    match command.as_str() {
-        "put" => {
-            if args.len() < 5 {
-                eprintln!("Usage: btree_cli <db_path> put <key> <value>");
-                exit(1);
+    let mut failed = false;
+    if command == "repl" {
+        // Still flush below, so commands applied before the error persist
+        if let Err(e) = repl(&db) {
+            eprintln!("ERROR: {}", e);
+            failed = true;
+        }
+    } else {
+        let rest: Vec<&str> = args[3..].iter().map(|s| s.as_str()).collect();
+        match execute(
+            &db,
+            command,
+            &rest,
+            &mut io::stdin().lock(),
+            &mut io::stdout(),
+        ) {
+            Ok(Reply::Status(status)) => println!("{}", status),
+            Ok(Reply::Value(value)) => println!("{}", display_value(&value)),
+            Ok(Reply::Values(values)) => {
+                for value in values {
+                    match value {
+                        Some(value) => println!("VALUE {}", display_value(&value)),
+                        None => println!("NOT_FOUND"),
+                    }
+                }
             }
-            let key = &args[3];
-            let value = &args[4];
-
-            match db.put(key.as_bytes(), value.as_bytes()) {
-                Ok(()) => println!("OK"),
-                Err(e) => {
+            Ok(Reply::Lines(lines)) => {
+                for line in lines {
+                    println!("{}", line);
+                }
+            }
+            Ok(Reply::Bytes(bytes)) => {
+                if let Err(e) = io::stdout().write_all(&bytes) {
                     eprintln!("ERROR: {}", e);
                     exit(1);
                 }
             }
+            Err(e) => {
+                eprintln!("ERROR: {}", e);
+                exit(1);
+            }
         }
+    }
 
-        "get" => {
-            if args.len() < 4 {
-                eprintln!("Usage: btree_cli <db_path> get <key>");
-                exit(1);
+    // Ensure data is persisted
+    if let Err(e) = db.flush() {
+        eprintln!("Warning: Failed to flush: {}", e);
+    }
+    if failed {
+        exit(1);
+    }
+}
+
+/// Serve commands from stdin until `quit` or EOF.
+fn repl(db: &Db) -> io::Result<()> {
+    let mut input = io::stdin().lock();
+    let mut out = BufWriter::new(io::stdout().lock());
+    let mut line = String::new();
+
+    loop {
+        line.clear();
+        if input.read_line(&mut line)? == 0 {
+            break;
+        }
+        let mut tokens = line.split_whitespace();
+        let command = match tokens.next() {
+            Some(command) => command.to_ascii_lowercase(),
+            None => continue,
+        };
+        if command == "quit" {
+            break;
+        }
+
+        let args = match read_args(tokens, &mut input) {
+            Ok(args) => args,
+            Err(e) => {
+                writeln!(out, "ERR {}", e)?;
+                out.flush()?;
+                return Err(e);
             }
-            let key = &args[3];
+        };
+        let result = args
+            .iter()
+            .map(|arg| std::str::from_utf8(arg))
+            .collect::<Result<Vec<&str>, _>>()
+            .map_err(|_| "Arguments must be valid UTF-8".to_string())
+            .and_then(|rest| execute(db, &command, &rest, &mut input, &mut out));
 
-            match db.get(key.as_bytes()) {
-                Ok(Some(value)) => {
-                    match String::from_utf8(value) {
-                        Ok(s) => println!("{}", s),
-                        Err(_) => println!("<binary data>"),
+        match result {
+            Ok(Reply::Status(status)) => writeln!(out, "{}", status)?,
+            Ok(Reply::Value(value)) => {
+                writeln!(out, "VALUE {}", value.len())?;
+                out.write_all(&value)?;
+            }
+            Ok(Reply::Values(values)) => {
+                writeln!(out, "VALUES {}", values.len())?;
+                for value in values {
+                    match value {
+                        Some(value) => {
+                            writeln!(out, "VALUE {}", value.len())?;
+                            out.write_all(&value)?;
+                        }
+                        None => writeln!(out, "NOT_FOUND")?,
                     }
                 }
-                Ok(None) => {
-                    println!("NOT_FOUND");
-                }
-                Err(e) => {
-                    eprintln!("ERROR: {}", e);
-                    exit(1);
-                }
             }
+            Ok(Reply::Lines(lines)) => {
+                let block: String = lines.iter().map(|line| format!("{}\n", line)).collect();
+                writeln!(out, "LINES {}", block.len())?;
+                out.write_all(block.as_bytes())?;
+            }
+            Ok(Reply::Bytes(bytes)) => {
+                writeln!(out, "BYTES {}", bytes.len())?;
+                out.write_all(&bytes)?;
+            }
+            Err(e) => writeln!(out, "ERR {}", e.replace('\n', " "))?,
+        }
+        out.flush()?;
+    }
+
+    Ok(())
+}
+
+/// Read the length-framed arguments of a repl command.
+///
+/// `lengths` are the byte lengths from the command line; the argument bytes
+/// follow on `input`. A malformed length means the stream can no longer be
+/// followed, so it is reported as an error that ends the repl.
+fn read_args<'a>(
+    lengths: impl Iterator<Item = &'a str>,
+    input: &mut impl BufRead,
+) -> io::Result<Vec<Vec<u8>>> {
+    let invalid = |msg: String| io::Error::new(io::ErrorKind::InvalidData, msg);
+    let lengths: Vec<usize> = lengths
+        .map(|len| {
+            len.parse()
+                .map_err(|_| invalid(format!("Invalid argument length: {}", len)))
+        })
+        .collect::<io::Result<_>>()?;
+    let total = lengths
+        .iter()
+        .try_fold(0usize, |total, &len| total.checked_add(len))
+        .ok_or_else(|| invalid("Argument lengths overflow".to_string()))?;
+
+    // Grow the buffer as data arrives rather than trusting `total` up front
+    let mut raw = Vec::new();
+    if input.by_ref().take(total as u64).read_to_end(&mut raw)? < total {
+        return Err(io::ErrorKind::UnexpectedEof.into());
+    }
+
+    let mut args = Vec::with_capacity(lengths.len());
+    let mut offset = 0;
+    for len in lengths {
+        args.push(raw[offset..offset + len].to_vec());
+        offset += len;
+    }
+    Ok(args)
+}
+
+/// Read one big-endian `u32` length-prefixed field of a `put_many` record.
+///
+/// A field longer than `max` is skipped without buffering it and reported
+/// as the error built by `too_large`, so the stream stays in sync.
+fn read_record_field(
+    input: &mut impl BufRead,
+    max: usize,
+    too_large: fn(usize) -> StorageError,
+) -> io::Result<Vec<u8>> {
+    let mut len = [0u8; 4];
+    input.read_exact(&mut len)?;
+    let len = u32::from_be_bytes(len) as usize;
+
+    let mut field = input.by_ref().take(len as u64);
+    if len > max {
+        if io::copy(&mut field, &mut io::sink())? < len as u64 {
+            return Err(io::ErrorKind::UnexpectedEof.into());
+        }
+        return Err(io::Error::new(
+            io::ErrorKind::InvalidData,
+            too_large(len).to_string(),
+        ));
+    }
+
+    let mut buf = Vec::with_capacity(len);
+    if field.read_to_end(&mut buf)? < len {
+        return Err(io::ErrorKind::UnexpectedEof.into());
+    }
+    Ok(buf)
+}
+
+/// Render a value for human-readable output.
+fn display_value(value: &[u8]) -> String {
+    match std::str::from_utf8(value) {
+        Ok(s) => s.to_string(),
+        Err(_) => "<binary data>".to_string(),
+    }
+}
+
+/// Run a single command against the database.
+///
+/// `input` supplies the payload of commands that read records (`put_many`),
+/// and `progress` receives lines streamed while a command runs
+/// (`bulk_insert` progress).
+fn execute(
+    db: &Db,
+    command: &str,
+    args: &[&str],
+    input: &mut impl BufRead,
+    progress: &mut impl Write,
+) -> Result<Reply, String> {
+    match command {
+        "put" => {
+            if args.len() < 2 {
+                return Err("Usage: btree_cli <db_path> put <key> <value>".to_string());
+            }
+            db.put(args[0].as_bytes(), args[1].as_bytes())
+                .map_err(|e| e.to_string())?;
+            Ok(Reply::Status("OK"))
+        }
+
+        "get" => {
+            if args.is_empty() {
+                return Err("Usage: btree_cli <db_path> get <key>".to_string());
+            }
+
+            match db.get(args[0].as_bytes()).map_err(|e| e.to_string())? {
+                Some(value) => Ok(Reply::Value(value)),
+                None => Ok(Reply::Status("NOT_FOUND")),
+            }
+        }
+
+        "mget" => {
+            if args.is_empty() {
+                return Err("Usage: btree_cli <db_path> mget <key>...".to_string());
+            }
+
+            let values = args
+                .iter()
+                .map(|key| db.get(key.as_bytes()).map_err(|e| e.to_string()))
+                .collect::<Result<_, _>>()?;
+            Ok(Reply::Values(values))
         }
 
         "delete" => {
-            if args.len() < 4 {
-                eprintln!("Usage: btree_cli <db_path> delete <key>");
-                exit(1);
+            if args.is_empty() {
+                return Err("Usage: btree_cli <db_path> delete <key>".to_string());
             }
-            let key = &args[3];
 
-            match db.delete(key.as_bytes()) {
-                Ok(true) => println!("DELETED"),
-                Ok(false) => println!("NOT_FOUND"),
-                Err(e) => {
-                    eprintln!("ERROR: {}", e);
-                    exit(1);
-                }
+            match db.delete(args[0].as_bytes()).map_err(|e| e.to_string())? {
+                true => Ok(Reply::Status("DELETED")),
+                false => Ok(Reply::Status("NOT_FOUND")),
             }
         }
 
         "scan" => {
-            let start = args.get(3).map(|s| s.as_bytes());
-            let end = args.get(4).map(|s| s.as_bytes());
-
-            match db.range(start, end) {
-                Ok(results) => {
-                    println!("COUNT: {}", results.len());
-                    for (key, value) in results {
-                        let key_str = String::from_utf8_lossy(&key);
-                        let value_str = String::from_utf8_lossy(&value);
-                        println!("{} -> {}", key_str, value_str);
-                    }
-                }
-                Err(e) => {
-                    eprintln!("ERROR: {}", e);
-                    exit(1);
-                }
+            let start = args.first().map(|s| s.as_bytes());
+            let end = args.get(1).map(|s| s.as_bytes());
+
+            let results = db.range(start, end).map_err(|e| e.to_string())?;
+            let mut lines = Vec::with_capacity(results.len() + 1);
+            lines.push(format!("COUNT: {}", results.len()));
+            for (key, value) in results {
+                let key_str = String::from_utf8_lossy(&key);
+                let value_str = String::from_utf8_lossy(&value);
+                lines.push(format!("{} -> {}", key_str, value_str));
             }
+            Ok(Reply::Lines(lines))
+        }
+
+        "scan_bin" => {
+            let start = args.first().map(|s| s.as_bytes());
+            let end = args.get(1).map(|s| s.as_bytes());
+
+            let results = db.range(start, end).map_err(|e| e.to_string())?;
+            let size: usize = results.iter().map(|(k, v)| 8 + k.len() + v.len()).sum();
+            let mut bytes = Vec::with_capacity(4 + size);
+            bytes.extend(&(results.len() as u32).to_be_bytes());
+            for (key, value) in results {
+                bytes.extend(&(key.len() as u32).to_be_bytes());
+                bytes.extend(&key);
+                bytes.extend(&(value.len() as u32).to_be_bytes());
+                bytes.extend(&value);
+            }
+            Ok(Reply::Bytes(bytes))
         }
 
         "stats" => {
             let stats = db.stats();
-            println!("page_count: {}", stats.page_count);
-            println!("buffer_pool_size: {}", stats.buffer_pool_size);
-            println!("tree_height: {}", stats.tree_height);
+            Ok(Reply::Lines(vec![
+                format!("page_count: {}", stats.page_count),
+                format!("buffer_pool_size: {}", stats.buffer_pool_size),
+                format!("tree_height: {}", stats.tree_height),
+            ]))
         }
 
         "bulk_insert" => {
-            if args.len() < 4 {
-                eprintln!("Usage: btree_cli <db_path> bulk_insert <count>");
-                exit(1);
+            if args.is_empty() {
+                return Err(
+                    "Usage: btree_cli <db_path> bulk_insert <count> [progress_every]".to_string(),
+                );
             }
-            let count: usize = match args[3].parse() {
-                Ok(n) => n,
-                Err(_) => {
-                    eprintln!("ERROR: Invalid count");
-                    exit(1);
-                }
+            let count: usize = args[0].parse().map_err(|_| "Invalid count".to_string())?;
+            let progress_every: usize = match args.get(1) {
+                Some(n) => n
+                    .parse()
+                    .map_err(|_| "Invalid progress_every".to_string())?,
+                None => 0,
             };
 
             let start = std::time::Instant::now();
             for i in 0..count {
                 let key = format!("key_{:08}", i);
                 let value = format!("value_{}", i);
-                if let Err(e) = db.put(key.as_bytes(), value.as_bytes()) {
-                    eprintln!("ERROR at {}: {}", i, e);
-                    exit(1);
+                db.put(key.as_bytes(), value.as_bytes())
+                    .map_err(|e| format!("at {}: {}", i, e))?;
+
+                if progress_every > 0 && (i + 1) % progress_every == 0 {
+                    writeln!(progress, "PROGRESS: {}", i + 1)
+                        .and_then(|_| progress.flush())
+                        .map_err(|e| e.to_string())?;
                 }
             }
             let elapsed = start.elapsed();
 
-            if let Err(e) = db.flush() {
-                eprintln!("ERROR flushing: {}", e);
-                exit(1);
-            }
+            db.flush().map_err(|e| format!("flushing: {}", e))?;
 
             let ops_per_sec = count as f64 / elapsed.as_secs_f64();
-            println!("INSERTED: {}", count);
-            println!("TIME_MS: {}", elapsed.as_millis());
-            println!("OPS_PER_SEC: {:.0}", ops_per_sec);
+            Ok(Reply::Lines(vec![
+                format!("INSERTED: {}", count),
+                format!("TIME_MS: {}", elapsed.as_millis()),
+                format!("OPS_PER_SEC: {:.0}", ops_per_sec),
+            ]))
         }
 
-        "debug" => {
-            if args.len() < 4 {
-                eprintln!("Usage: btree_cli <db_path> debug <key>");
-                exit(1);
+        "put_many" => {
+            if args.is_empty() {
+                return Err("Usage: btree_cli <db_path> put_many <count>".to_string());
             }
-            let key = &args[3];
+            let count: usize = args[0].parse().map_err(|_| "Invalid count".to_string())?;
 
-            match db.debug_get(key.as_bytes()) {
-                Ok(trace) => {
-                    for line in trace {
-                        println!("{}", line);
+            // Read and validate the whole batch before inserting, so an error
+            // leaves no unread records behind in repl mode and writes nothing.
+            // `count` comes from the client, so it is not used to preallocate.
+            let mut records = Vec::new();
+            let mut error = None;
+            for i in 0..count {
+                let key =
+                    read_record_field(input, MAX_KEY_SIZE, |size| StorageError::KeyTooLarge {
+                        size,
+                        max: MAX_KEY_SIZE,
+                    });
+                let value =
+                    read_record_field(input, MAX_VALUE_SIZE, |size| StorageError::ValueTooLarge {
+                        size,
+                        max: MAX_VALUE_SIZE,
+                    });
+                match (key, value) {
+                    (Ok(key), Ok(value)) => records.push((key, value)),
+                    (Err(e), _) | (_, Err(e)) => {
+                        let eof = e.kind() == io::ErrorKind::UnexpectedEof;
+                        error.get_or_insert(format!("record {}: {}", i, e));
+                        if eof {
+                            break;
+                        }
                     }
                 }
-                Err(e) => {
-                    eprintln!("ERROR: {}", e);
-                    exit(1);
-                }
             }
+            if let Some(e) = error {
+                return Err(e);
+            }
+
+            for (i, (key, value)) in records.iter().enumerate() {
+                db.put(key, value).map_err(|e| format!("at {}: {}", i, e))?;
+            }
+
+            db.flush().map_err(|e| format!("flushing: {}", e))?;
+            Ok(Reply::Status("OK"))
         }
 
-        _ => {
-            eprintln!("Unknown command: {}", command);
-            exit(1);
+        "debug" => {
+            if args.is_empty() {
+                return Err("Usage: btree_cli <db_path> debug <key>".to_string());
+            }
+
+            let trace = db
+                .debug_get(args[0].as_bytes())
+                .map_err(|e| e.to_string())?;
+            Ok(Reply::Lines(trace))
         }
-    }
 
-    // Ensure data is persisted
-    if let Err(e) = db.flush() {
-        eprintln!("Warning: Failed to flush: {}", e);
+        _ => Err(format!("Unknown command: {}", command)),
     }
 }
@@ -6,121 +6,300 @@ This script builds the Rust CLI tool and runs various tests against it
 to verify the B-tree storage engine works correctly.
 """
 
+import contextlib
+import io
 import os
+import re
 import subprocess
 import tempfile
 import shutil
+import struct
 import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Callable, Dict, Iterable, Optional, Tuple, List
 
 # Path to the project root
 PROJECT_ROOT = Path(__file__).parent.parent
 CLI_BINARY = PROJECT_ROOT / "target" / "release" / "btree_cli"
 
+# Resolved once; every client spawns the CLI from this path
+_CLI_PATH = str(CLI_BINARY.resolve())
+
+# Big-endian u32 length prefix used by the scan_bin wire format
+_U32 = struct.Struct(">I")
+
+# Records encoded per write when streaming a put_many batch
+PUT_MANY_CHUNK = 1024
+
+# `name: value` lines printed by stats and bulk_insert
+_KV_RE = re.compile(rb"^([^:\n]+): (.+)$", re.M)
+
+
+def _encode_records(pairs: List[Tuple[str, str]]) -> bytes:
+    """Encode records as `<u32 key_len><key><u32 value_len><value>`."""
+    encoded = ((key.encode(), value.encode()) for key, value in pairs)
+    return b"".join(
+        b"".join((_U32.pack(len(key)), key, _U32.pack(len(value)), value))
+        for key, value in encoded
+    )
+
 
 class BTreeTestClient:
-    """Client wrapper for testing the B-tree CLI."""
+    """Client wrapper for testing the B-tree CLI.
+
+    Keeps a single `btree_cli <db> repl` process open and sends it
+    length-framed commands, so each operation costs a pipe round trip
+    instead of a fork/exec and database open, and keys and values may
+    contain any characters.
+    """
 
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.cli_path = str(CLI_BINARY)
-
-    def _run(self, *args) -> Tuple[int, str, str]:
-        """Run CLI command and return (exit_code, stdout, stderr)."""
-        cmd = [self.cli_path, self.db_path] + list(args)
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        return result.returncode, result.stdout.strip(), result.stderr.strip()
+        self.cli_path = _CLI_PATH
+        self.proc = subprocess.Popen(
+            [self.cli_path, self.db_path, "repl"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def _send(self, command: str, *args: str, payload: Iterable[bytes] = ()):
+        """Send a command with length-framed arguments, followed by the
+        `payload` chunks for commands that read records from stdin."""
+        encoded = [arg.encode() for arg in args]
+        header = " ".join([command, *(str(len(arg)) for arg in encoded)])
+        self.proc.stdin.write(header.encode() + b"\n" + b"".join(encoded))
+        for chunk in payload:
+            self.proc.stdin.write(chunk)
+        self.proc.stdin.flush()
+
+    def _readline_bytes(self) -> bytes:
+        """Read one reply line without decoding it."""
+        line = self.proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"btree_cli exited unexpectedly (code {self.proc.poll()})")
+        return line.rstrip(b"\n")
+
+    def _readline(self) -> str:
+        """Read one reply line."""
+        return self._readline_bytes().decode()
+
+    def _read_exact(self, size: int) -> bytes:
+        """Read exactly `size` bytes of reply data."""
+        data = self.proc.stdout.read(size)
+        if len(data) != size:
+            raise RuntimeError(f"btree_cli exited unexpectedly (code {self.proc.poll()})")
+        return data
+
+    def _run_checked(self, *args, payload: Iterable[bytes] = ()) -> bytes:
+        """Send a command with a single-line reply and return its raw status.
+
+        Callers compare against ASCII tokens and decode only what they keep.
+        """
+        self._send(*args, payload=payload)
+        return self._readline_bytes()
+
+    def _run(self, *args, payload: Iterable[bytes] = ()) -> Tuple[str, bytes]:
+        """Send a command and return (status, block).
+
+        `block` holds the raw text of multi-line replies (`LINES <n>`).
+        """
+        self._send(*args, payload=payload)
+        status = self._readline()
+        return status, self._read_block(status)
+
+    def _read_block(self, status: str) -> bytes:
+        """Read the `<n>`-byte text block following a `LINES <n>` status, if
+        any."""
+        if not status.startswith("LINES "):
+            return b""
+        return self._read_exact(int(status[len("LINES "):]))
+
+    def close(self):
+        """Stop the CLI process, flushing the database to disk."""
+        if self.proc.poll() is None:
+            self.proc.stdin.write(b"quit\n")
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc.stdout.close()
+
+    def __enter__(self) -> "BTreeTestClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def put(self, key: str, value: str) -> bool:
         """Insert or update a key-value pair."""
-        code, stdout, stderr = self._run("put", key, value)
-        if code != 0:
-            print(f"PUT ERROR: {stderr}")
+        status = self._run_checked("put", key, value)
+        if status.startswith(b"ERR "):
+            print(f"PUT ERROR: {status[4:].decode()}")
             return False
-        return stdout == "OK"
+        return status == b"OK"
+
+    def put_many(self, pairs: List[Tuple[str, str]]) -> bool:
+        """Insert or update many key-value pairs in one batch.
+
+        Records are length-prefixed, so keys and values may contain any
+        characters, and are encoded and written PUT_MANY_CHUNK at a time, so
+        large batches never build the whole payload at once.
+        """
+        payload = (
+            _encode_records(pairs[i:i + PUT_MANY_CHUNK])
+            for i in range(0, len(pairs), PUT_MANY_CHUNK)
+        )
+        status = self._run_checked("put_many", str(len(pairs)), payload=payload)
+        if status.startswith(b"ERR "):
+            print(f"PUT_MANY ERROR: {status[4:].decode()}")
+            return False
+        return status == b"OK"
 
     def get(self, key: str) -> Optional[str]:
         """Get value for a key, returns None if not found."""
-        code, stdout, stderr = self._run("get", key)
-        if code != 0:
-            print(f"GET ERROR: {stderr}")
+        self._send("get", key)
+        status = self._readline_bytes()
+        if status.startswith(b"ERR "):
+            print(f"GET ERROR: {status[4:].decode()}")
             return None
-        if stdout == "NOT_FOUND":
+        return self._read_value(status)
+
+    def _read_value(self, status: bytes) -> Optional[str]:
+        """Read the value following a `VALUE <n>` status; None for `NOT_FOUND`."""
+        if status == b"NOT_FOUND":
             return None
-        return stdout
+        return self._read_exact(int(status[len(b"VALUE "):])).decode("utf-8", "replace")
+
+    def mget(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """Get values for several keys in one round trip.
+
+        Missing keys map to None.
+        """
+        self._send("mget", *keys)
+        status = self._readline_bytes()
+        if status.startswith(b"ERR "):
+            print(f"MGET ERROR: {status[4:].decode()}")
+            return {}
+        return {key: self._read_value(self._readline_bytes()) for key in keys}
 
     def delete(self, key: str) -> bool:
         """Delete a key, returns True if deleted."""
-        code, stdout, stderr = self._run("delete", key)
-        if code != 0:
-            print(f"DELETE ERROR: {stderr}")
+        status = self._run_checked("delete", key)
+        if status.startswith(b"ERR "):
+            print(f"DELETE ERROR: {status[4:].decode()}")
             return False
-        return stdout == "DELETED"
+        return status == b"DELETED"
 
     def scan(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[str, str]]:
         """Scan keys in range, returns list of (key, value) tuples."""
-        args = ["scan"]
+        args = ["scan_bin"]
         if start is not None:
             args.append(start)
         if end is not None:
             args.append(end)
 
-        code, stdout, stderr = self._run(*args)
-        if code != 0:
-            print(f"SCAN ERROR: {stderr}")
+        self._send(*args)
+        status = self._readline()
+        if status.startswith("ERR "):
+            print(f"SCAN ERROR: {status[4:]}")
             return []
 
+        buf = memoryview(self._read_exact(int(status[len("BYTES "):])))
+        (count,) = _U32.unpack_from(buf, 0)
+        offset = _U32.size
         results = []
-        lines = stdout.split("\n")
-        for line in lines[1:]:  # Skip COUNT line
-            if " -> " in line:
-                key, value = line.split(" -> ", 1)
-                results.append((key, value))
+        for _ in range(count):
+            (key_len,) = _U32.unpack_from(buf, offset)
+            offset += _U32.size
+            key = str(buf[offset:offset + key_len], "utf-8", "replace")
+            offset += key_len
+            (value_len,) = _U32.unpack_from(buf, offset)
+            offset += _U32.size
+            value = str(buf[offset:offset + value_len], "utf-8", "replace")
+            offset += value_len
+            results.append((key, value))
         return results
 
     def stats(self) -> dict:
         """Get database statistics."""
-        code, stdout, stderr = self._run("stats")
-        if code != 0:
-            print(f"STATS ERROR: {stderr}")
+        status, block = self._run("stats")
+        if status.startswith("ERR "):
+            print(f"STATS ERROR: {status[4:]}")
             return {}
 
-        stats = {}
-        for line in stdout.split("\n"):
-            if ": " in line:
-                key, value = line.split(": ", 1)
-                stats[key] = int(value)
-        return stats
+        return {key.decode(): int(value) for key, value in _KV_RE.findall(block)}
 
     def bulk_insert(self, count: int) -> dict:
         """Bulk insert test records."""
-        code, stdout, stderr = self._run("bulk_insert", str(count))
-        if code != 0:
-            print(f"BULK_INSERT ERROR: {stderr}")
+        return self.bulk_insert_streaming(count)
+
+    def bulk_insert_streaming(
+        self,
+        count: int,
+        progress_every: int = 0,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> dict:
+        """Bulk insert test records, reporting progress as it happens.
+
+        With `progress_every`, `on_progress` is called with the number of
+        records inserted so far each time the CLI reports progress.
+        """
+        self._send("bulk_insert", str(count), str(progress_every))
+        status = self._readline()
+        while status.startswith("PROGRESS: "):
+            if on_progress is not None:
+                on_progress(int(status[len("PROGRESS: "):]))
+            status = self._readline()
+        block = self._read_block(status)
+        if status.startswith("ERR "):
+            print(f"BULK_INSERT ERROR: {status[4:]}")
             return {}
 
-        result = {}
-        for line in stdout.split("\n"):
-            if ": " in line:
-                key, value = line.split(": ", 1)
-                result[key] = float(value) if "." in value else int(value)
-        return result
+        return {
+            key.decode(): float(value) if b"." in value else int(value)
+            for key, value in _KV_RE.findall(block)
+        }
+
+
+def needs_build() -> bool:
+    """Check whether the CLI binary is missing or older than its sources.
+
+    Sources are Cargo.toml, the library and src/bin/btree_cli.rs; other
+    binaries under src/bin do not affect btree_cli. Set FORCE_BUILD=1 to
+    always run cargo.
+    """
+    if os.environ.get("FORCE_BUILD") == "1" or not CLI_BINARY.exists():
+        return True
+    binary_mtime = CLI_BINARY.stat().st_mtime
+    src = PROJECT_ROOT / "src"
+    sources = [
+        PROJECT_ROOT / "Cargo.toml",
+        src / "bin" / "btree_cli.rs",
+        *(path for path in src.rglob("*.rs") if (src / "bin") not in path.parents),
+    ]
+    return any(path.stat().st_mtime > binary_mtime for path in sources)
 
 
 def build_cli():
     """Build the CLI binary in release mode."""
+    if not needs_build():
+        print("btree_cli is up to date, skipping build")
+        return True
+
     print("Building btree_cli in release mode...")
     result = subprocess.run(
         ["cargo", "build", "--release", "--bin", "btree_cli"],
         cwd=PROJECT_ROOT,
-        capture_output=True,
-        text=True
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
     )
     if result.returncode != 0:
         print("Build failed:")
-        print(result.stderr)
+        print(result.stderr.decode(errors="replace"))
         return False
+    # cargo leaves the binary untouched when a changed file does not affect
+    # it; bump its mtime so needs_build() does not keep reporting it stale.
+    CLI_BINARY.touch()
     print("Build successful!")
     return True
 
@@ -152,6 +331,17 @@ def test_basic_operations(client: BTreeTestClient) -> bool:
     assert not client.delete("nonexistent"), "Delete of missing key should return False"
     print("✓ Delete of missing key handled")
 
+    # Test keys and values with spaces, newlines and empty values
+    framed = [("spaced key", "hello world"), ("multiline", "line1\nline2"), ("empty", "")]
+    for key, value in framed:
+        assert client.put(key, value), f"Put {key!r} failed"
+    for key, value in framed:
+        result = client.get(key)
+        assert result == value, f"Get {key!r}: expected {value!r}, got {result!r}"
+    values = client.mget([key for key, _ in framed] + ["nonexistent"])
+    assert values == {**dict(framed), "nonexistent": None}, f"Mget returned {values}"
+    print("✓ Spaces, newlines and empty values round-trip")
+
     return True
 
 
@@ -160,18 +350,19 @@ def test_multiple_keys(client: BTreeTestClient) -> bool:
     print("\n=== Test: Multiple Keys ===")
 
     keys = ["apple", "banana", "cherry", "date", "elderberry"]
-    for i, key in enumerate(keys):
-        assert client.put(key, f"value_{i}"), f"Put {key} failed"
+    values = [f"value_{i}" for i in range(len(keys))]
+    assert client.put_many(list(zip(keys, values))), "Put many failed"
 
-    # Verify all keys
+    # Verify all keys from a single full scan
+    results = client.scan()
+    stored = dict(results)
     for i, key in enumerate(keys):
-        value = client.get(key)
-        assert value == f"value_{i}", f"Get {key} returned wrong value: {value}"
+        value = stored.get(key)
+        assert value == f"value_{i}", f"Scan {key} returned wrong value: {value}"
 
     print(f"✓ Inserted and retrieved {len(keys)} keys")
 
     # Test scan all
-    results = client.scan()
     assert len(results) == len(keys), f"Scan returned {len(results)}, expected {len(keys)}"
     # Results should be sorted
     result_keys = [r[0] for r in results]
@@ -186,10 +377,9 @@ def test_range_scan(client: BTreeTestClient) -> bool:
     print("\n=== Test: Range Scan ===")
 
     # Insert ordered data
-    for i in range(10):
-        key = f"key_{i:02d}"
-        value = f"val_{i}"
-        assert client.put(key, value), f"Put {key} failed"
+    keys = [f"key_{i:02d}" for i in range(10)]
+    values = [f"val_{i}" for i in range(10)]
+    assert client.put_many(list(zip(keys, values))), "Put many failed"
 
     # Scan range
     results = client.scan("key_03", "key_07")
@@ -210,13 +400,13 @@ def test_persistence(temp_dir: str) -> bool:
     db_path = os.path.join(temp_dir, "persist_test.db")
 
     # Write some data
-    client1 = BTreeTestClient(db_path)
-    assert client1.put("persist_key", "persist_value"), "Initial put failed"
+    with BTreeTestClient(db_path) as client1:
+        assert client1.put("persist_key", "persist_value"), "Initial put failed"
     print("✓ Written data to database")
 
     # Open database again and verify
-    client2 = BTreeTestClient(db_path)
-    value = client2.get("persist_key")
+    with BTreeTestClient(db_path) as client2:
+        value = client2.get("persist_key")
     assert value == "persist_value", f"Persistence check failed: got {value}"
     print("✓ Data persisted across database reopen")
 
@@ -227,19 +417,22 @@ def test_large_dataset(client: BTreeTestClient) -> bool:
     """Test with a larger dataset to trigger page splits."""
     print("\n=== Test: Large Dataset (1000 keys) ===")
 
-    result = client.bulk_insert(1000)
+    progress = []
+    result = client.bulk_insert_streaming(1000, progress_every=250, on_progress=progress.append)
     assert result.get("INSERTED") == 1000, f"Bulk insert failed: {result}"
+    assert progress == [250, 500, 750, 1000], f"Unexpected progress reports: {progress}"
 
     ops_per_sec = result.get("OPS_PER_SEC", 0)
     time_ms = result.get("TIME_MS", 0)
     print(f"✓ Inserted 1000 keys in {time_ms}ms ({ops_per_sec:.0f} ops/sec)")
 
     # Verify some random keys
-    for i in [0, 499, 999]:
+    sample = [0, 499, 999]
+    values = client.mget([f"key_{i:08d}" for i in sample])
+    for i in sample:
         key = f"key_{i:08d}"
-        value = client.get(key)
         expected = f"value_{i}"
-        assert value == expected, f"Key {key}: expected {expected}, got {value}"
+        assert values.get(key) == expected, f"Key {key}: expected {expected}, got {values.get(key)}"
     print("✓ Verified sample keys from large dataset")
 
     # Check stats
@@ -260,17 +453,70 @@ def test_special_characters(client: BTreeTestClient) -> bool:
         ("key.with.dots", "value.with.dots"),
         ("key123", "value456"),
         ("UPPERCASE", "lowercase"),
+        ("key with spaces", "value with spaces"),
+        ("key\twith\ttabs", "value\nwith\nnewlines"),
+        ("empty_value", ""),
     ]
 
+    assert client.put_many(test_cases), "Put many failed"
+    stored = dict(client.scan())
     for key, value in test_cases:
-        assert client.put(key, value), f"Put {key} failed"
-        result = client.get(key)
-        assert result == value, f"Get {key}: expected {value}, got {result}"
+        result = stored.get(key)
+        assert result == value, f"Scan {key}: expected {value}, got {result}"
 
     print(f"✓ {len(test_cases)} special character cases passed")
+
+    # A batch with an oversized value is rejected without writing any record
+    assert not client.put_many([("batch_ok", "v"), ("batch_big", "x" * 4096)]), "Oversized batch accepted"
+    assert client.get("batch_ok") is None, "Rejected batch was partially written"
+    assert client.get("key123") == "value456", "Client out of sync after rejected batch"
+    print("✓ Oversized put_many batch rejected as a whole")
     return True
 
 
+# (test function, database file name or None if the test takes temp_dir)
+TESTS = [
+    (test_basic_operations, "test1.db"),
+    (test_multiple_keys, "test2.db"),
+    (test_range_scan, "test3.db"),
+    (test_persistence, None),
+    (test_large_dataset, "test5.db"),
+    (test_special_characters, "test6.db"),
+]
+
+
+def run_test(test, temp_dir: str, db_name: Optional[str]) -> Tuple[str, bool, str]:
+    """Run one test in isolation and return (name, passed, captured output)."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            if db_name is None:
+                passed = test(temp_dir)
+            else:
+                with BTreeTestClient(os.path.join(temp_dir, db_name)) as client:
+                    passed = test(client)
+        except AssertionError as e:
+            print(f"\n❌ Test assertion failed: {e}")
+            passed = False
+        except Exception as e:
+            print(f"\n❌ Test error: {e}")
+            traceback.print_exc(file=output)
+            passed = False
+    return test.__name__, passed, output.getvalue()
+
+
+def make_temp_dir() -> str:
+    """Create the directory holding the test databases.
+
+    Prefers /dev/shm so database writes never hit real storage; durability
+    is irrelevant for these tests. BTREE_TEST_TMPDIR overrides the location.
+    """
+    base = os.environ.get("BTREE_TEST_TMPDIR")
+    if base is None:
+        base = next((d for d in ("/dev/shm", "/tmp") if os.access(d, os.W_OK)), None)
+    return tempfile.mkdtemp(prefix="btree_test_", dir=base)
+
+
 def run_all_tests():
     """Run all tests."""
     print("=" * 60)
@@ -283,46 +529,24 @@ def run_all_tests():
         return False
 
     # Create temp directory for test databases
-    temp_dir = tempfile.mkdtemp(prefix="btree_test_")
+    temp_dir = make_temp_dir()
     print(f"\nUsing temp directory: {temp_dir}")
 
     try:
-        # Run tests
+        # Each test uses its own database file, so they can run in parallel
         all_passed = True
-
-        # Test 1: Basic operations
-        db1 = os.path.join(temp_dir, "test1.db")
-        client1 = BTreeTestClient(db1)
-        if not test_basic_operations(client1):
-            all_passed = False
-
-        # Test 2: Multiple keys
-        db2 = os.path.join(temp_dir, "test2.db")
-        client2 = BTreeTestClient(db2)
-        if not test_multiple_keys(client2):
-            all_passed = False
-
-        # Test 3: Range scan
-        db3 = os.path.join(temp_dir, "test3.db")
-        client3 = BTreeTestClient(db3)
-        if not test_range_scan(client3):
-            all_passed = False
-
-        # Test 4: Persistence
-        if not test_persistence(temp_dir):
-            all_passed = False
-
-        # Test 5: Large dataset
-        db5 = os.path.join(temp_dir, "test5.db")
-        client5 = BTreeTestClient(db5)
-        if not test_large_dataset(client5):
-            all_passed = False
-
-        # Test 6: Special characters
-        db6 = os.path.join(temp_dir, "test6.db")
-        client6 = BTreeTestClient(db6)
-        if not test_special_characters(client6):
-            all_passed = False
+        max_workers = min(len(TESTS), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(run_test, test, temp_dir, db_name)
+                for test, db_name in TESTS
+            ]
+            for future in as_completed(futures):
+                name, passed, output = future.result()
+                print(output, end="")
+                if not passed:
+                    print(f"❌ {name} failed")
+                    all_passed = False
 
         # Summary
         print("\n" + "=" * 60)
@@ -334,12 +558,8 @@ def run_all_tests():
 
         return all_passed
 
-    except AssertionError as e:
-        print(f"\n❌ Test assertion failed: {e}")
-        return False
     except Exception as e:
         print(f"\n❌ Test error: {e}")
-        import traceback
         traceback.print_exc()
         return False
     finally: